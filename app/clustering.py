@@ -1,58 +1,217 @@
+import numpy as np
 import tensorflow as tf
 
-def tensorflow_kmeans(data, num_clusters, num_iterations=100, penalty_threshold=0.3, penalty_factor=0.5):
+# Optional GPU backend, only used when RAPIDS cuML is installed and TensorFlow sees a GPU
+try:
+    from cuml.cluster import KMeans as CuKMeans
+except ImportError:
+    CuKMeans = None
+
+USE_CUML = CuKMeans is not None and len(tf.config.list_physical_devices("GPU")) > 0
+
+# XLA compiles `_kmeans_step` once per input shape, so the data is zero-padded up to a power of two
+# number of rows (at least this many) and the padding rows get zero weight
+MIN_PADDED_POINTS = 64
+
+@tf.function(jit_compile=True)
+def _kmeans_step(data, point_mask, data_sq_norms, centroids, penalty_threshold, penalty_factor):
     """
-    Custom K-means clustering implementation using TensorFlow with soft penalties for distant points.
+    Single K-means iteration (assignment + soft-penalty centroid update) for a batch of R restarts,
+    compiled with XLA so the distance, argmin and segment sums are fused.
 
-    This function performs K-means clustering, enhanced with a soft penalty mechanism to reduce 
-    the influence of outliers or distant points on centroid updates. The algorithm is useful for 
-    datasets where clusters are unevenly distributed or outliers are present.
+    `centroids` has shape (R, K, D) and `point_mask` (N,) is 1 for real points, 0 for padding rows.
+    Returns a tuple of the updated centroids (R, K, D) and the cluster assignments (R, N) used to compute them.
+    """
+    num_restarts = tf.shape(centroids)[0]
+    num_clusters = tf.shape(centroids)[1]
+
+    # Compute squared distances from points to centroids via ||x||^2 + ||c||^2 - 2 x.c
+    # (one batched matmul instead of an R x N x K x D broadcast, argmin doesn't need the sqrt)
+    # The cross term stays in float32: on [0, 1] data the terms cancel, low precision flips assignments
+    centroid_sq_norms = tf.reduce_sum(centroids * centroids, axis=2)
+    cross = tf.einsum("nd,rkd->rnk", data, centroids)
+    distances = data_sq_norms[None] + centroid_sq_norms[:, None, :] - 2.0 * cross
+
+    # Assign each data point to the cluster of the nearest centroid (per restart)
+    cluster_assignments = tf.argmin(distances, axis=2)
+
+    # Calculate distances of points to their assigned centroid
+    assigned_centroids = tf.gather(centroids, cluster_assignments, batch_dims=1)
+    cluster_distances = tf.norm(data[None] - assigned_centroids, axis=2)
+
+    # Apply penalty: Weight decreases for distant points
+    weights = tf.maximum(1.0 - penalty_factor * tf.maximum(cluster_distances - penalty_threshold, 0), 0.01)
+    # Padding rows don't pull on any centroid
+    weights = weights * point_mask[None]
+
+    # Weighted sums per (restart, cluster) in one pass: offset the segment ids of each restart
+    # by r * K so a single segment sum covers every restart
+    segment_ids = cluster_assignments + tf.cast(tf.range(num_restarts) * num_clusters, tf.int64)[:, None]
+    num_segments = num_restarts * num_clusters
+    weighted_sum = tf.math.unsorted_segment_sum(data[None] * weights[:, :, None], segment_ids, num_segments)
+    weight_sum = tf.math.unsorted_segment_sum(weights, segment_ids, num_segments)
+    weighted_sum = tf.reshape(weighted_sum, tf.shape(centroids))
+    weight_sum = tf.reshape(weight_sum, [num_restarts, num_clusters, 1])
+
+    # Calculate new centroids, empty clusters keep their previous centroid
+    new_centroids = weighted_sum / tf.maximum(weight_sum, 1e-9)
+    new_centroids = tf.where(weight_sum > 0, new_centroids, centroids)
+
+    return new_centroids, cluster_assignments
+
+# Fixed input signature (any dataset size, restart or cluster count) so every request reuses one trace
+# (XLA still compiles the step per shape, see MIN_PADDED_POINTS)
+@tf.function(
+    reduce_retracing=True,
+    input_signature=[
+        tf.TensorSpec([None, None], tf.float32),  # data
+        tf.TensorSpec([None], tf.float32),  # point_mask
+        tf.TensorSpec([None, None, None], tf.float32),  # initial_centroids
+        tf.TensorSpec([], tf.int32),  # num_iterations
+        tf.TensorSpec([], tf.float32),  # penalty_threshold
+        tf.TensorSpec([], tf.float32),  # penalty_factor
+        tf.TensorSpec([], tf.float32),  # tolerance
+    ],
+)
+def _run_kmeans(data, point_mask, initial_centroids, num_iterations, penalty_threshold, penalty_factor, tolerance):
+    """
+    Drive `_kmeans_step` with a `tf.while_loop` so the whole clustering runs as one graph
+    instead of re-entering the TF runtime from Python on every iteration.
+
+    Stops early once no centroid (of any restart) moves more than `tolerance`.
+    """
+    # Squared norms of the data points, constant across iterations
+    data_sq_norms = tf.reduce_sum(data * data, axis=1, keepdims=True)
+
+    def cond(i, shift, centroids, cluster_assignments):
+        return tf.logical_and(i < num_iterations, shift > tolerance)
+
+    def body(i, shift, centroids, cluster_assignments):
+        new_centroids, cluster_assignments = _kmeans_step(
+            data, point_mask, data_sq_norms, centroids, penalty_threshold, penalty_factor
+        )
+        # Largest centroid movement of this iteration, used as the convergence check
+        shift = tf.reduce_max(tf.norm(new_centroids - centroids, axis=2))
+        return i + 1, shift, new_centroids, cluster_assignments
+
+    initial_assignments = tf.zeros([tf.shape(initial_centroids)[0], tf.shape(data)[0]], dtype=tf.int64)
+    _, _, centroids, cluster_assignments = tf.while_loop(
+        cond, body, [tf.constant(0), tf.constant(float("inf")), initial_centroids, initial_assignments]
+    )
+    return centroids, cluster_assignments
+
+def _kmeans_plus_plus_init(data, num_clusters, num_restarts):
+    """
+    k-means++ seeding for a batch of restarts: the first centroid is a random point, every next one
+    is sampled with probability proportional to its squared distance to the closest centroid so far.
+
+    Returns the initial centroids with shape (R, K, D).
+    """
+    num_points = tf.shape(data)[0]
+    data_sq_norms = tf.reduce_sum(data * data, axis=1)
+
+    centroids = [tf.gather(data, tf.random.uniform([num_restarts], maxval=num_points, dtype=tf.int32))]
+    closest_sq_dist = tf.fill([num_restarts, num_points], float("inf"))
+    for _ in range(1, num_clusters):
+        # Only the newest centroid can bring points closer, so one matmul per step is enough
+        last = centroids[-1]
+        sq_dist = data_sq_norms[None, :] + tf.reduce_sum(last * last, axis=1, keepdims=True) - 2.0 * tf.matmul(last, data, transpose_b=True)
+        closest_sq_dist = tf.minimum(closest_sq_dist, tf.maximum(sq_dist, 0.0))
+
+        # Small epsilon keeps the sampling valid when every point coincides with a centroid
+        next_indices = tf.random.categorical(tf.math.log(closest_sq_dist + 1e-12), 1)[:, 0]
+        centroids.append(tf.gather(data, next_indices))
+
+    return tf.stack(centroids, axis=1)
+
+def batched_tensorflow_kmeans(data, num_clusters, num_restarts=10, num_iterations=100, penalty_threshold=0.3, penalty_factor=0.5, tolerance=1e-4):
+    """
+    Run several independent restarts of the soft-penalty K-means (see `tensorflow_kmeans`) at once.
+
+    All restarts are stacked into a (R, K, D) centroid tensor and iterated together, so the
+    distance computation is a single batched matmul instead of R separate clustering runs.
 
     Parameters:
         data (numpy.ndarray or tf.Tensor): The input dataset, where each row represents a data point.
         num_clusters (int): The number of clusters to form.
+        num_restarts (int, optional): Number of random initializations to run. Default is 10.
         num_iterations (int, optional): The maximum number of iterations to perform. Default is 100.
         penalty_threshold (float, optional): Distance threshold beyond which soft penalties are applied. Default is 0.3.
         penalty_factor (float, optional): Factor controlling the penalty strength for distant points. Default is 0.5.
+        tolerance (float, optional): Stop once no centroid moves more than this between iterations. Default is 1e-4.
 
     Returns:
         tuple:
-            - centroids (numpy.ndarray): Final centroid positions after clustering.
-            - cluster_assignments (numpy.ndarray): Cluster indices assigned to each data point.
+            - centroids (numpy.ndarray): Final centroid positions of each restart, shape (R, K, D).
+            - cluster_assignments (numpy.ndarray): Cluster indices of each data point per restart, shape (R, N).
+
+    Note: when cuML and a GPU are available the restarts are offloaded to `cuml.KMeans` instead,
+    which runs plain K-means (no soft penalties).
     """
+    if USE_CUML:
+        return _cuml_kmeans(data, num_clusters, num_restarts, num_iterations, tolerance)
+
     data = tf.convert_to_tensor(data, dtype=tf.float32)
-    initial_centroids = tf.slice(tf.random.shuffle(data), [0, 0], [num_clusters, -1])
-    centroids = tf.Variable(initial_centroids)
 
-    for _ in range(num_iterations):
-        # Compute distances from points to centroids (Euclidean distance)
-        distances = tf.norm(data[:, None] - centroids, axis=2)
+    # Each restart gets its own k-means++ seeding (from the real points only)
+    initial_centroids = _kmeans_plus_plus_init(data, num_clusters, num_restarts)
 
-        # Assign each data point to the cluster of the nearest centroid
-        cluster_assignments = tf.argmin(distances, axis=1)
+    # Pad the rows up to a power of two so requests with similar point counts share one XLA compilation
+    num_points = int(data.shape[0])
+    padded_points = max(MIN_PADDED_POINTS, 1 << (num_points - 1).bit_length())
+    padded_data = tf.pad(data, [[0, padded_points - num_points], [0, 0]])
+    point_mask = tf.cast(tf.range(padded_points) < num_points, tf.float32)
 
-        # Update centroids with soft penalties
-        new_centroids = []
-        for c in range(num_clusters):
-            # Get points in the current cluster
-            cluster_points = tf.gather(data, tf.where(cluster_assignments == c)[:, 0])
-            if cluster_points.shape[0] == 0:  # Handle empty clusters
-                new_centroids.append(centroids[c])
-                continue
+    # Scalars are passed as tensors so different values don't retrace the graph
+    centroids, cluster_assignments = _run_kmeans(
+        padded_data,
+        point_mask,
+        initial_centroids,
+        tf.constant(num_iterations, dtype=tf.int32),
+        tf.constant(penalty_threshold, dtype=tf.float32),
+        tf.constant(penalty_factor, dtype=tf.float32),
+        tf.constant(tolerance, dtype=tf.float32),
+    )
 
-            # Calculate distances of points to the current centroid
-            cluster_distances = tf.norm(cluster_points - centroids[c], axis=1)
+    return centroids.numpy(), cluster_assignments.numpy()[:, :num_points]
 
-            # Apply penalty: Weight decreases for distant points
-            weights = tf.maximum(1.0 - penalty_factor * tf.maximum(cluster_distances - penalty_threshold, 0), 0.01)
-            weighted_sum = tf.reduce_sum(cluster_points * weights[:, None], axis=0)
-            weight_sum = tf.reduce_sum(weights)
+def _cuml_kmeans(data, num_clusters, num_restarts, num_iterations, tolerance):
+    """
+    Run the K-means restarts on the GPU with cuML, returning results in the same
+    (R, K, D) / (R, N) layout as `batched_tensorflow_kmeans`.
+    """
+    data = np.asarray(data, dtype=np.float32)
+    centroids, cluster_assignments = [], []
+    for restart in range(num_restarts):
+        km = CuKMeans(
+            n_clusters=num_clusters, max_iter=num_iterations, tol=tolerance, random_state=restart, output_type="numpy"
+        ).fit(data)
+        centroids.append(np.asarray(km.cluster_centers_))
+        cluster_assignments.append(np.asarray(km.labels_))
+    return np.stack(centroids), np.stack(cluster_assignments)
 
-            # Calculate new centroid
-            new_centroid = weighted_sum / weight_sum
-            new_centroids.append(new_centroid)
+def tensorflow_kmeans(data, num_clusters, num_iterations=100, penalty_threshold=0.3, penalty_factor=0.5, tolerance=1e-4):
+    """
+    Custom K-means clustering implementation using TensorFlow with soft penalties for distant points.
 
-        # Update centroids
-        centroids.assign(tf.stack(new_centroids))
+    This function performs K-means clustering, enhanced with a soft penalty mechanism to reduce
+    the influence of outliers or distant points on centroid updates. The algorithm is useful for
+    datasets where clusters are unevenly distributed or outliers are present.
 
-    return centroids.numpy(), cluster_assignments.numpy()
\ No newline at end of file
+    Parameters:
+        data (numpy.ndarray or tf.Tensor): The input dataset, where each row represents a data point.
+        num_clusters (int): The number of clusters to form.
+        num_iterations (int, optional): The maximum number of iterations to perform. Default is 100.
+        penalty_threshold (float, optional): Distance threshold beyond which soft penalties are applied. Default is 0.3.
+        penalty_factor (float, optional): Factor controlling the penalty strength for distant points. Default is 0.5.
+        tolerance (float, optional): Stop once no centroid moves more than this between iterations. Default is 1e-4.
+
+    Returns:
+        tuple:
+            - centroids (numpy.ndarray): Final centroid positions after clustering.
+            - cluster_assignments (numpy.ndarray): Cluster indices assigned to each data point.
+    """
+    centroids, cluster_assignments = batched_tensorflow_kmeans(
+        data, num_clusters, 1, num_iterations, penalty_threshold, penalty_factor, tolerance
+    )
+    return centroids[0], cluster_assignments[0]
\ No newline at end of file
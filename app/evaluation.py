@@ -1,7 +1,5 @@
 import numpy as np
 from sklearn.metrics import silhouette_score, davies_bouldin_score
-from scipy.spatial.distance import cdist
-from collections import Counter
 
 def compute_silhouette_score(data, labels):
     return silhouette_score(data, labels)
@@ -10,13 +8,12 @@ def compute_davies_bouldin_index(data, labels):
     return davies_bouldin_score(data, labels)
 
 def compute_intra_cluster_distance(data, labels, centroids):
-    total_distance = 0
-    for i in range(len(centroids)):
-        cluster_points = data[labels == i]
-        total_distance += np.sum(cdist(cluster_points, [centroids[i]]))
+    # Distance of every point to its own centroid in a single pass
+    diff = data - centroids[labels]
+    total_distance = np.sqrt(np.einsum("ij,ij->i", diff, diff)).sum()
     return total_distance
 
 def check_cluster_balance(labels, max_locations_per_day=5):
-    cluster_counts = Counter(labels)
-    overloaded_clusters = [i for i, count in cluster_counts.items() if count > max_locations_per_day]
+    cluster_counts = np.bincount(labels)
+    overloaded_clusters = np.where(cluster_counts > max_locations_per_day)[0].tolist()
     return cluster_counts, overloaded_clusters
\ No newline at end of file
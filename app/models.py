@@ -1,6 +1,20 @@
-from pydantic import BaseModel
+from collections import namedtuple
+from pydantic import BaseModel, PrivateAttr
 from typing import List, Optional
 
+def to_minutes(time_str):
+    """
+    Convert a "HH:MM" string to minutes since midnight (int), cheaper than datetime.strptime.
+    """
+    hours, minutes = time_str.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def to_time_str(minutes):
+    """
+    Convert minutes since midnight back to a "HH:MM" string.
+    """
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
 class Location(BaseModel):
     name: str
     coordinates: List[float]
@@ -9,6 +23,22 @@ class Location(BaseModel):
     # Default to 20:00
     closing_hours: Optional[str] = "20:00"
     duration: int
+    # Opening/closing hours as minutes since midnight, parsed once after validation
+    # (private, so they aren't part of the request schema)
+    _opening_min: int = PrivateAttr()
+    _closing_min: int = PrivateAttr()
+
+    def model_post_init(self, __context):
+        self._opening_min = to_minutes(self.opening_hours)
+        self._closing_min = to_minutes(self.closing_hours)
+
+    @property
+    def opening_min(self):
+        return self._opening_min
+
+    @property
+    def closing_min(self):
+        return self._closing_min
 
 class ClusteringInput(BaseModel):
     points: List[Location]
@@ -16,4 +46,8 @@ class ClusteringInput(BaseModel):
     # Default to 08:00
     daily_start_time: Optional[str] = "08:00"  
     # Default to 20:00
-    daily_end_time: Optional[str] = "20:00"    
\ No newline at end of file
+    daily_end_time: Optional[str] = "20:00"    
+
+# Plain tuple version of a Location used by the scheduler, built once per request so the
+# scheduling loops read attributes at tuple speed instead of going through Pydantic
+ScheduleLocation = namedtuple("ScheduleLocation", "name coordinates opening_min closing_min duration")
\ No newline at end of file
@@ -1,20 +1,23 @@
 from fastapi import APIRouter, HTTPException
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler
-from app.models import ClusteringInput
-from app.clustering import tensorflow_kmeans
-from app.scheduling import parallel_schedule_clusters, handle_unvisitable
+from sklearn.cluster import KMeans
+from app.models import ClusteringInput, ScheduleLocation, to_minutes
+from app.clustering import batched_tensorflow_kmeans
+from app.scheduling import parallel_schedule_clusters, handle_unvisitable, WORKER_POOL
 # from app.utils import visualize_clusters, visualize_routing, generate_schedule_table
+# from app.models import to_time_str
 from app.evaluation import (
     compute_silhouette_score,
     # compute_davies_bouldin_index,
     # compute_intra_cluster_distance,
 )
-from concurrent.futures import ThreadPoolExecutor
 
 # Initialize the API router for clustering-related endpoints
 clustering_router = APIRouter()
 
+# Max number of points used to compute the silhouette score when ranking restarts (silhouette is O(N^2))
+SILHOUETTE_SAMPLE_SIZE = 1024
+
 @clustering_router.post("/cluster/", summary="Cluster Locations and Generate Schedules")
 def cluster_data(data: ClusteringInput): 
     """
@@ -30,12 +33,19 @@ def cluster_data(data: ClusteringInput):
     Returns a dict containing grouped clusters with schedules and unvisitable locations (response)
     """
     # Extract coordinates, names, bla bla bla and create a mapping of location names to their details
-    coordinates = np.array([loc.coordinates for loc in data.points])
+    # Coordinates go straight into a preallocated float32 buffer (the dtype TF clusters in)
+    coordinates = np.empty((len(data.points), 2), dtype=np.float32)
+    for i, loc in enumerate(data.points):
+        coordinates[i] = loc.coordinates
     names = [loc.name for loc in data.points]
-    locations = {loc.name: loc for loc in data.points}
+    locations = {
+        loc.name: ScheduleLocation(loc.name, tuple(loc.coordinates), loc.opening_min, loc.closing_min, loc.duration)
+        for loc in data.points
+    }
     num_clusters = data.num_clusters
-    daily_start = data.daily_start_time
-    daily_end = data.daily_end_time
+    # Daily time window as minutes since midnight, parsed once for the scheduler
+    daily_start = to_minutes(data.daily_start_time)
+    daily_end = to_minutes(data.daily_end_time)
 
     # Input validation
     if num_clusters < 1:
@@ -44,10 +54,13 @@ def cluster_data(data: ClusteringInput):
     if len(coordinates) < num_clusters:
         raise HTTPException(status_code=400, detail="Number of clusters cannot exceed number of points")
 
-    # Normalize coordinates to scale features between 0 and 1
+    # Normalize coordinates to scale features between 0 and 1 (in place, no extra copy)
     # Knp minmax? Tak tahu distribusinya normal atau agak laen
-    scaler = MinMaxScaler()
-    normalized_data = scaler.fit_transform(coordinates)
+    min_vals = coordinates.min(axis=0)
+    value_range = coordinates.max(axis=0) - min_vals
+    value_range[value_range == 0] = 1  # Constant feature stays at 0, like MinMaxScaler
+    normalized_data = np.subtract(coordinates, min_vals, out=coordinates)
+    np.divide(normalized_data, value_range, out=normalized_data)
 
     if num_clusters == 1:
         # Berhubung cuma 1 cluster, lempar semua ke dalam, gosah cluster lagi
@@ -61,6 +74,17 @@ def cluster_data(data: ClusteringInput):
         #     "davies_bouldin_index": None,
         #     "intra_cluster_distance": None,
         # }
+    elif num_clusters == len(coordinates):
+        # Satu tempat satu cluster, nothing to cluster either
+        best_labels = np.arange(len(coordinates))
+        best_centroids = normalized_data.copy()
+        best_clusters = group_locations(locations, best_labels, num_clusters)
+    elif len(coordinates) <= num_clusters * 2:
+        # Few points per cluster: sklearn's KMeans is far cheaper here than building the TF graph + restarts
+        kmeans = KMeans(n_clusters=num_clusters, n_init=3).fit(normalized_data)
+        best_labels = kmeans.labels_
+        best_centroids = kmeans.cluster_centers_
+        best_clusters = group_locations(locations, best_labels, num_clusters)
     else:
         # Perform parallel clustering to find the best cluster
         best_clusters, best_labels, best_centroids, best_metrics = parallel_find_best_clusters(
@@ -98,7 +122,7 @@ def cluster_data(data: ClusteringInput):
     #             "Name": loc["name"],
     #             "Start Time": loc["start_time"],
     #             "End Time": loc["end_time"],
-    #             "Opening Hours": f"{locations[loc['name']].opening_hours} - {locations[loc['name']].closing_hours}",
+    #             "Opening Hours": f"{to_time_str(locations[loc['name']].opening_min)} - {to_time_str(locations[loc['name']].closing_min)}",
     #             "Duration (hours)": locations[loc["name"]].duration,
     #             "Reason": loc.get("reason", "N/A"),
     #             "Proximity": loc.get("proximity_to_next", "N/A"),
@@ -146,20 +170,21 @@ def cluster_data(data: ClusteringInput):
 
     return response
 
-# Do we need this multithreading too? Or is it too much? (For clustering)
 def parallel_find_best_clusters(normalized_data, locations, num_clusters, num_iterations):
     """
-    Perform K-means clustering in parallel and prioritize balanced clusters.
+    Perform K-means clustering restarts in parallel and prioritize balanced clusters.
 
-    - Executes multiple K-means clustering iterations concurrently using parallel processing.
+    - Executes multiple K-means clustering restarts at once as a single batched TensorFlow run.
     - Evaluates each clustering based on a composite score that considers the silhouette
     score and cluster balance. The best clustering = highest composite score.
+    - For large inputs the silhouette used for ranking is computed on one random subsample
+    (shared by all restarts), the reported metric is still computed on the full data.
 
     Parameters:
         normalized_data (numpy.ndarray): Normalized dataset with rows representing data points.
         locations (dict): Mapping of location names to their details.
         num_clusters (int): The number of clusters to form.
-        num_iterations (int): Number of clustering iterations to perform in parallel.
+        num_iterations (int): Number of clustering restarts to perform in parallel.
 
     Returns:
         tuple:
@@ -174,28 +199,32 @@ def parallel_find_best_clusters(normalized_data, locations, num_clusters, num_it
     best_metrics = None
     best_composite_score = float("-inf")
 
-    def cluster_and_evaluate(_):
-        """
-        Perform a single clustering iteration and compute evaluation metrics.
+    # Same random subsample for every restart so their silhouette scores stay comparable
+    num_points = len(normalized_data)
+    sample_idx = np.random.choice(num_points, min(num_points, SILHOUETTE_SAMPLE_SIZE), replace=False)
+    sample_data = normalized_data[sample_idx]
 
-        This helper function executes the K-means clustering and calculates:
+    def evaluate(labels):
+        """
+        Compute evaluation metrics for a single clustering restart:
         - Silhouette score: Measures cluster cohesion and separation.
         - Cluster balance score: Measures variance in cluster sizes.
 
         Returns:
-            tuple: Centroids, labels, silhouette score, and cluster balance score.
+            tuple: Silhouette score and cluster balance score.
         """
-        centroids, labels = tensorflow_kmeans(normalized_data, num_clusters)
-        silhouette = compute_silhouette_score(normalized_data, labels)
+        silhouette = compute_silhouette_score(sample_data, labels[sample_idx])
         cluster_balance_score = compute_cluster_balance_score(labels, num_clusters)
-        return centroids, labels, silhouette, cluster_balance_score
+        return silhouette, cluster_balance_score
+
+    # Run all clustering restarts together in one batched graph
+    all_centroids, all_labels = batched_tensorflow_kmeans(normalized_data, num_clusters, num_restarts=num_iterations)
 
-    # Run clustering iterations in parallel
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        results = list(executor.map(cluster_and_evaluate, range(num_iterations)))
+    # Score the restarts in parallel on the shared pool
+    scores = list(WORKER_POOL.map(evaluate, all_labels))
 
     # Select the best cluster configuration based on composite score
-    for centroids, labels, silhouette, cluster_balance in results:
+    for centroids, labels, (silhouette, cluster_balance) in zip(all_centroids, all_labels, scores):
         composite_score = (0.7 * silhouette) + (0.3 * (1 - cluster_balance))  # Combine metrics
         if composite_score > best_composite_score:
             best_composite_score = composite_score
@@ -205,12 +234,25 @@ def parallel_find_best_clusters(normalized_data, locations, num_clusters, num_it
                 "silhouette_score": silhouette,
                 "cluster_balance_score": cluster_balance,
             }
-            best_clusters = {i: [] for i in range(num_clusters)}
-            for name, cluster_id in zip(locations.keys(), labels):
-                best_clusters[int(cluster_id)].append(locations[name])
+            best_clusters = group_locations(locations, labels, num_clusters)
+
+    # Report the silhouette of the chosen clustering on the full data if ranking used a subsample
+    if num_points > SILHOUETTE_SAMPLE_SIZE:
+        best_metrics["silhouette_score"] = compute_silhouette_score(normalized_data, best_labels)
 
     return best_clusters, best_labels, best_centroids, best_metrics
 
+def group_locations(locations, labels, num_clusters):
+    """
+    Group location details by their cluster label.
+
+    Returns a dict mapping each cluster id to the list of its locations.
+    """
+    clusters = {i: [] for i in range(num_clusters)}
+    for name, cluster_id in zip(locations.keys(), labels):
+        clusters[int(cluster_id)].append(locations[name])
+    return clusters
+
 def compute_cluster_balance_score(labels, num_clusters):
     """
     Compute a score for cluster balance based on the variance of cluster sizes.
@@ -220,6 +262,6 @@ def compute_cluster_balance_score(labels, num_clusters):
 
     Returns float of normalized variance of cluster sizes (lower values indicate better balance)
     """
-    cluster_counts = [np.sum(labels == i) for i in range(num_clusters)]
-    balance_score = np.var(cluster_counts) / np.mean(cluster_counts)  # Normalize by mean
+    cluster_counts = np.bincount(labels, minlength=num_clusters)
+    balance_score = cluster_counts.var() / cluster_counts.mean()  # Normalize by mean
     return balance_score
\ No newline at end of file
@@ -1,6 +1,32 @@
-from datetime import datetime, timedelta
-from geopy.distance import geodesic
+import os
+import bisect
+import numpy as np
 from concurrent.futures import ThreadPoolExecutor
+from app.models import to_time_str
+
+# Mean Earth radius used for haversine distances
+EARTH_RADIUS_KM = 6371.0088
+
+# Shared worker pool (scheduling clusters here, scoring clustering restarts in routes),
+# reused across requests instead of spawning threads per call
+WORKER_POOL = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+def haversine_matrix(coordinates):
+    """
+    Compute the pairwise great-circle distance matrix (in km) between coordinates.
+
+    Parameters:
+        coordinates (numpy.ndarray): Array of shape (N, 2) with [latitude, longitude] in degrees.
+
+    Returns:
+        numpy.ndarray: N x N matrix of haversine distances in kilometers.
+    """
+    lat = np.radians(coordinates[:, 0])
+    lon = np.radians(coordinates[:, 1])
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
 
 def handle_unvisitable(locations, clusters, daily_start, daily_end):
     """
@@ -9,21 +35,31 @@ def handle_unvisitable(locations, clusters, daily_start, daily_end):
     Parameters:
         locations (list): Unvisitable locations list
         clusters (dict): Dictionary containing existing clusters and their schedules
-        daily_start (str): Daily starting time in "HH:MM" format
-        daily_end (str): Daily ending time in "HH:MM" format
+        daily_start (int): Daily starting time in minutes since midnight
+        daily_end (int): Daily ending time in minutes since midnight
 
     Returns:
         dict: A dictionary with updated clusters and remaining unvisitable locations
     """
     
     new_unvisitable = []
+    # Start times of each schedule, kept in sync to find insertion points with bisect
+    # Schedules aren't always in start time order (zero-duration entries are appended at the end),
+    # so a schedule is sorted once, on its first insertion, like the old append + sort did
+    schedule_keys = {}
     for location in locations:
         fit = False
         for cluster_id, cluster_schedule in clusters.items():
             result = schedule_single_location(location, cluster_schedule["schedule"], daily_start, daily_end)
             if result:
-                cluster_schedule["schedule"].append(result)
-                cluster_schedule["schedule"].sort(key=lambda x: x["start_time"])
+                if cluster_id not in schedule_keys:
+                    cluster_schedule["schedule"].sort(key=lambda x: x["start_min"])
+                    schedule_keys[cluster_id] = [entry["start_min"] for entry in cluster_schedule["schedule"]]
+                # Insert in start time order (after equal start times, like a stable sort would)
+                keys = schedule_keys[cluster_id]
+                idx = bisect.bisect_right(keys, result["start_min"])
+                cluster_schedule["schedule"].insert(idx, result)
+                keys.insert(idx, result["start_min"])
                 fit = True
                 break
         if not fit:
@@ -36,36 +72,33 @@ def schedule_single_location(location, current_schedule, daily_start, daily_end)
     Schedule a single location within a cluster, ensuring it fits within the daily and business hour constraints.
 
     Parameters:
-        location (dict): The location to schedule, with details such as opening hours and duration.
+        location (ScheduleLocation): The location to schedule, with details such as opening hours and duration.
         current_schedule (list): Current schedule of the cluster.
-        daily_start (str): The daily starting time in "HH:MM" format.
-        daily_end (str): The daily ending time in "HH:MM" format.
+        daily_start (int): The daily starting time in minutes since midnight.
+        daily_end (int): The daily ending time in minutes since midnight.
 
     Returns:
         dict or None: The scheduled entry or None if the location cannot be scheduled.
     """
     
-    # Convert string to datetime object
-    daily_start_time = datetime.strptime(daily_start, "%H:%M")
-    daily_end_time = datetime.strptime(daily_end, "%H:%M")
-    opening_time = datetime.strptime(location.opening_hours, "%H:%M")
-    closing_time = datetime.strptime(location.closing_hours, "%H:%M")
+    # All times are handled as integer minutes since midnight
+    opening_time = location.opening_min
+    closing_time = location.closing_min
+    duration = location.duration * 60
+    latest_end = min(daily_end, closing_time)
 
     # Determine the earliest possible start time
-    start_time = max(daily_start_time, opening_time)
-    end_time = start_time + timedelta(hours=location.duration)
+    start_time = max(daily_start, opening_time)
+    end_time = start_time + duration
 
     # Ensure the location fits within business hours and daily time constraints
-    if end_time > min(daily_end_time, closing_time):
+    if end_time > latest_end:
         return None
 
     # Check availability in the schedule
     # Iterating through the current schedule
     for i, event in enumerate(current_schedule):
-        
-        # Convert all event start and end times to datetime objects
-        event_start = datetime.strptime(event["start_time"], "%H:%M")
-        event_end = datetime.strptime(event["end_time"], "%H:%M")
+        event_start = event["start_min"]
 
         # If location fits before the first event
         if i == 0 and end_time <= event_start:
@@ -73,22 +106,22 @@ def schedule_single_location(location, current_schedule, daily_start, daily_end)
 
         # If location fits between events
         if i > 0:
-            prev_event_end = datetime.strptime(current_schedule[i - 1]["end_time"], "%H:%M")
-            if prev_event_end + timedelta(hours=location.duration) <= event_start:
+            prev_event_end = current_schedule[i - 1]["end_min"]
+            if prev_event_end + duration <= event_start:
                 start_time = prev_event_end
-                end_time = start_time + timedelta(hours=location.duration)
+                end_time = start_time + duration
                 return create_schedule_entry(location, start_time, end_time)
 
     # If location fits after the last event
     if current_schedule:
-        last_event_end = datetime.strptime(current_schedule[-1]["end_time"], "%H:%M")
-        if last_event_end + timedelta(hours=location.duration) <= min(daily_end_time, closing_time):
+        last_event_end = current_schedule[-1]["end_min"]
+        if last_event_end + duration <= latest_end:
             start_time = last_event_end
-            end_time = start_time + timedelta(hours=location.duration)
+            end_time = start_time + duration
             return create_schedule_entry(location, start_time, end_time)
 
     # If no events exist and location fits in the day
-    if not current_schedule and end_time <= min(daily_end_time, closing_time):
+    if not current_schedule and end_time <= latest_end:
         return create_schedule_entry(location, start_time, end_time)
 
     return None  # Cannot fit
@@ -96,112 +129,93 @@ def schedule_single_location(location, current_schedule, daily_start, daily_end)
 def create_schedule_entry(location, start_time, end_time):
     """
     Returning schedule entry with the location's details and scheduled times.
+    Times are kept as minutes since midnight ("start_min"/"end_min") for scheduling and as "HH:MM" strings for the response.
     """
     return {
         "name": location.name,
         "coordinates": location.coordinates,
-        "start_time": start_time.strftime("%H:%M"),
-        "end_time": end_time.strftime("%H:%M")
+        "start_min": start_time,
+        "end_min": end_time,
+        "start_time": to_time_str(start_time),
+        "end_time": to_time_str(end_time)
     }
 
-def schedule_cluster_with_priorities(cluster, daily_start="08:00", daily_end="20:00"):
+def schedule_cluster_with_priorities(cluster, daily_start=480, daily_end=1200):
     """
     Schedule locations within a cluster, balancing proximity and business hours.
 
     Parameters:
         cluster (list): List of locations in the cluster.
-        daily_start (str): The daily starting time in "HH:MM" format.
-        daily_end (str): The daily ending time in "HH:MM" format.
+        daily_start (int): The daily starting time in minutes since midnight (default 08:00).
+        daily_end (int): The daily ending time in minutes since midnight (default 20:00).
 
     Return a dict of scheduled locations and any unvisitable locations.
     """
     schedule = []
     unvisitable = []
-    current_time = datetime.strptime(daily_start, "%H:%M")
+    current_time = daily_start
+
+    if not cluster:
+        return {"schedule": schedule, "unvisitable": unvisitable}
 
-    while cluster:
+    # Pairwise distances between all locations of the cluster, computed once
+    distances = haversine_matrix(np.array([loc.coordinates for loc in cluster], dtype=np.float64))
+    remaining = list(range(len(cluster)))
+    scheduled = []  # Cluster indices of the scheduled locations, parallel to schedule
+
+    while remaining:
         if not schedule:
             # Select the location with the earliest opening time
-            next_location = min(cluster, key=lambda x: datetime.strptime(x.opening_hours, "%H:%M"))
-            cluster.remove(next_location)
+            next_idx = min(remaining, key=lambda i: cluster[i].opening_min)
             reason = "Chosen as the first location based on earliest opening hours"
         else:
             # Calculate scores for remaining locations based on proximity and time flexibility
-            last_location = schedule[-1]
-            next_location = min(cluster, key=lambda loc: calculate_score(loc, last_location, current_time))
-            cluster.remove(next_location)
-            distance_to_last = geodesic(last_location["coordinates"], next_location.coordinates).kilometers
-            reason = f"Chosen based on proximity ({distance_to_last:.2f} km) and business hours compatibility"
+            last_idx = scheduled[-1]
+            next_idx = min(remaining, key=lambda i: calculate_score(cluster[i], distances[last_idx, i], current_time))
+            reason = f"Chosen based on proximity ({distances[last_idx, next_idx]:.2f} km) and business hours compatibility"
+        remaining.remove(next_idx)
+        next_location = cluster[next_idx]
 
         # Schedule the selected location
         result = schedule_single_location(next_location, schedule, daily_start, daily_end)
         if result:
             result["reason"] = reason
             schedule.append(result)
-            current_time = datetime.strptime(result["end_time"], "%H:%M")
+            scheduled.append(next_idx)
+            current_time = result["end_min"]
         else:
             unvisitable.append(next_location)
 
     # Add proximity details to each scheduled location
     for i in range(len(schedule) - 1):
-        distance_to_next = geodesic(schedule[i]["coordinates"], schedule[i + 1]["coordinates"]).kilometers
-        schedule[i]["proximity_to_next"] = f"{distance_to_next:.2f} km"
+        schedule[i]["proximity_to_next"] = f"{distances[scheduled[i], scheduled[i + 1]]:.2f} km"
 
     if schedule:
         schedule[-1]["proximity_to_next"] = "N/A"  # Last location has no next location
 
     return {"schedule": schedule, "unvisitable": unvisitable}
 
-def calculate_score(location, last_location, current_time):
+def calculate_score(location, distance_to_last, current_time):
     """
-    Calculate a weighted score for scheduling a location.
+    Calculate a weighted score for scheduling a location, given its distance (km) to the last scheduled location.
     """
-    proximity_score = geodesic(last_location["coordinates"], location.coordinates).kilometers
-    closing_time = datetime.strptime(location.closing_hours, "%H:%M")
-    time_flexibility = max((closing_time - current_time).total_seconds() / 3600, 0.1)
+    proximity_score = distance_to_last
+    time_flexibility = max((location.closing_min - current_time) / 60, 0.1)
     return proximity_score + (1 / time_flexibility) # Weighted score (lower is better).
 
-def parallel_schedule_clusters(clusters, daily_start="08:00", daily_end="20:00", num_threads=4):
+def parallel_schedule_clusters(clusters, daily_start=480, daily_end=1200):
     """
-    Schedulling multiple clusters in parallel using multithreading.
+    Schedulling multiple clusters in parallel using the shared thread pool.
     
     Return a dict of scheduled clusters and unvisitable locations.
     """
     results = {}
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        futures = {
-            cluster_id: executor.submit(iterative_schedule_cluster, cluster_locations, daily_start, daily_end)
-            for cluster_id, cluster_locations in clusters.items()
-        }
-        for cluster_id, future in futures.items():
-            results[cluster_id] = future.result()
-
-    return results
-
-# 20 Iterations overkill?
-def iterative_schedule_cluster(cluster, daily_start="08:00", daily_end="20:00", max_iterations=20):
-    """
-    Find the best schedule for a single cluster from multiple iterations
-    
-    Return a dict of best schedule and any remaining unvisitable locations
-    """
-    best_schedule = None
-    best_unvisitable = None
-    best_score = float("inf")
-
-    for _ in range(max_iterations):
-        result = schedule_cluster_with_priorities(cluster[:], daily_start, daily_end)
-        unvisitable_count = len(result["unvisitable"])
-        schedule_length = len(result["schedule"])
-        score = unvisitable_count * 1000 - schedule_length
-
-        if score < best_score:
-            best_score = score
-            best_schedule = result["schedule"]
-            best_unvisitable = result["unvisitable"]
-
-        # Stop early if no unvisitable locations
-        if unvisitable_count == 0:
-            break
-
-    return {"schedule": best_schedule, "unvisitable": best_unvisitable}
\ No newline at end of file
+    # Scheduling is deterministic for a given cluster, so a single pass per cluster is enough
+    futures = {
+        cluster_id: WORKER_POOL.submit(schedule_cluster_with_priorities, cluster_locations, daily_start, daily_end)
+        for cluster_id, cluster_locations in clusters.items()
+    }
+    for cluster_id, future in futures.items():
+        results[cluster_id] = future.result()
+
+    return results
\ No newline at end of file
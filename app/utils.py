@@ -1,15 +1,283 @@
+import atexit
+import functools
+import os
+import stat
+import tempfile
+import threading
+from io import BytesIO
+import matplotlib
+# Plots are only rendered to files on the server, use the non-interactive Agg backend (no GUI toolkit setup)
+matplotlib.use('Agg', force=True)
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
 import numpy as np
-import pandas as pd
+from PIL import Image
+
+plt.ioff()
+# Simplify paths and chunk long ones so Agg handles large line plots faster
+matplotlib.rcParams['path.simplify'] = True
+matplotlib.rcParams['path.simplify_threshold'] = 1.0
+matplotlib.rcParams['agg.path.chunksize'] = 10000
+
+# Numba is optional, without it the NumPy implementations below are used
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# mpl-scatter-density is optional (registers the 'scatter_density' projection), used for very large plots
+try:
+    import mpl_scatter_density
+except ImportError:
+    mpl_scatter_density = None
+
+# Above this many points visualize_clusters rasterizes clusters as density maps instead of markers
+DENSITY_PLOT_THRESHOLD = 20000
+
+# Max number of point labels per group in visualize_routing (crowded groups only label every k-th point)
+MAX_ROUTING_LABELS = 50
+
+# Above this many points per group visualize_routing merges points on the same grid cell into one marker
+MERGE_POINTS_THRESHOLD = 200
+# Grid cell size (in degrees, ~100 m) used to merge overlapping points
+MERGE_GRID_SIZE = 1e-3
+
+# Figures reused across visualize_* calls (one per plot kind), cleared instead of recreated each time
+_FIG_CACHE = {}
+# Serializes the plotting functions: sync endpoints run on a thread pool, and the cached figures
+# (and pyplot's current figure) are shared by all threads
+_PLOT_LOCK = threading.RLock()
+
+def _locked_plot(func):
+    """
+    Run a plotting function while holding `_PLOT_LOCK`.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _PLOT_LOCK:
+            return func(*args, **kwargs)
+    return wrapper
+
+def _get_fig(key, figsize):
+    """
+    Return the cached figure for `key` (created on first use or after it was closed), cleared, resized and made
+    the current pyplot figure.
+    Must be called with `_PLOT_LOCK` held (see `_locked_plot`).
+    """
+    fig = _FIG_CACHE.get(key)
+    # A figure closed from outside (e.g. plt.close("all")) has lost its Agg canvas (and its number may
+    # belong to a newer figure), build a fresh one then. plt.figure(number) also makes it current.
+    if fig is not None and plt.fignum_exists(fig.number) and plt.figure(fig.number) is fig:
+        fig.clear()
+        fig.set_size_inches(figsize)
+    else:
+        fig = plt.figure(figsize=figsize)
+        _FIG_CACHE[key] = fig
+    return fig
+
+@atexit.register
+@_locked_plot
+def _close_cached_figures():
+    for fig in _FIG_CACHE.values():
+        plt.close(fig)
+    _FIG_CACHE.clear()
+
+# Number of neutral gray entries in the fixed plot palette (tinted entries take up the rest, 256 max)
+PALETTE_GRAY_LEVELS = 128
+
+def _build_plot_palette():
+    """
+    Fixed palette for the plot PNGs: the tab10 cluster colors and red (centroids / unvisitable points),
+    each blended towards the white background so antialiased edges and alpha lines keep their hue,
+    plus a gray ramp for text, axes and grid lines.
+    """
+    base_colors = [tuple(int(round(c * 255)) for c in color) for color in plt.cm.tab10.colors] + [(255, 0, 0)]
+    white = np.array([255, 255, 255])
+    palette = {(255, 255, 255), (0, 0, 0), (176, 176, 176)}  # Background, text, default grid color
+    for color in base_colors:
+        for alpha in (1.0, 0.85, 0.7, 0.55, 0.4, 0.25, 0.1):
+            palette.add(tuple(np.round(alpha * np.array(color) + (1 - alpha) * white).astype(int)))
+    # Dense gray ramp (every other level) so light antialiased grays never snap to a tinted blend
+    for level in np.linspace(0, 255, PALETTE_GRAY_LEVELS).round().astype(int):
+        palette.add((level, level, level))
+    palette = sorted(palette)
+    image = Image.new("P", (1, 1))
+    # Unused palette slots repeat the first entry so quantize never maps onto them
+    image.putpalette([value for color in palette + palette[:1] * (256 - len(palette)) for value in color])
+    return image
+
+_PLOT_PALETTE = _build_plot_palette()
+
+# Process umask, read once at import (it can only be read by setting it, which would race with other threads)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _output_mode(output_path):
+    """
+    Permission bits for a file written to output_path: those of the existing file, else 0o666 minus the umask.
+    """
+    try:
+        return stat.S_IMODE(os.stat(output_path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+def _write_png(buf, output_path):
+    """
+    Write an in-memory PNG with a single write to a temporary file that atomically replaces output_path.
+    The temporary file gets a unique name next to output_path (concurrent writers don't share it)
+    and is removed if the write fails. It is created as 0600, so it gets the mode of the existing
+    output (or the umask default, like a plain open) before replacing it.
+    """
+    tmp_file = tempfile.NamedTemporaryFile(dir=os.path.dirname(output_path) or ".", suffix=".tmp", delete=False)
+    try:
+        with tmp_file:
+            tmp_file.write(buf.getvalue())
+        os.chmod(tmp_file.name, _output_mode(output_path))
+        os.replace(tmp_file.name, output_path)
+    except BaseException:
+        os.remove(tmp_file.name)
+        raise
+
+def _save_palettized_png(fig, output_path):
+    """
+    Save a figure as a paletted (mode "P") PNG through Pillow, plots only use a handful of colors
+    so this gives much smaller files and a cheaper zlib encode than matplotlib's RGBA PNG.
+
+    The rendered Agg buffer is mapped onto the fixed `_PLOT_PALETTE` (no dithering), so the cluster
+    colors come out exactly as drawn, and encoded in memory with fast zlib compression (level 1).
+    """
+    fig.canvas.draw()
+    image = Image.fromarray(np.asarray(fig.canvas.buffer_rgba())).convert("RGB")
+
+    buf = BytesIO()
+    image.quantize(palette=_PLOT_PALETTE, dither=Image.Dither.NONE).save(
+        buf, format="PNG", optimize=False, compress_level=1
+    )
+    _write_png(buf, output_path)
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _normalize_kernel(coords, out, min_vals, max_vals):
+        """
+        Fused min-max normalization: one pass for the per-column min/max, one pass writing the output.
+        """
+        n, d = coords.shape
+        for j in range(d):
+            min_vals[j] = coords[0, j]
+            max_vals[j] = coords[0, j]
+        for i in range(1, n):
+            for j in range(d):
+                value = coords[i, j]
+                if value < min_vals[j]:
+                    min_vals[j] = value
+                if value > max_vals[j]:
+                    max_vals[j] = value
+        for j in range(d):
+            value_range = max_vals[j] - min_vals[j]
+            # Constant column (or a single point) maps to 0, same as the NumPy path
+            if value_range == 0:
+                value_range = 1.0
+            for i in range(n):
+                out[i, j] = (coords[i, j] - min_vals[j]) / value_range
+
+    @njit(cache=True, fastmath=True)
+    def _normalize_nx2_kernel(coords, out, min_vals, max_vals):
+        """
+        `_normalize_kernel` specialized for (N, 2) coordinates: min/max of both columns are tracked in
+        four scalars over unit-stride rows (no inner column loop), which the compiler can vectorize.
+        """
+        n = coords.shape[0]
+        min0 = max0 = coords[0, 0]
+        min1 = max1 = coords[0, 1]
+        for i in range(1, n):
+            x0 = coords[i, 0]
+            x1 = coords[i, 1]
+            min0 = min(min0, x0)
+            max0 = max(max0, x0)
+            min1 = min(min1, x1)
+            max1 = max(max1, x1)
+        range0 = max0 - min0
+        range1 = max1 - min1
+        inv0 = 1.0 / range0 if range0 != 0 else 1.0
+        inv1 = 1.0 / range1 if range1 != 0 else 1.0
+        for i in range(n):
+            out[i, 0] = (coords[i, 0] - min0) * inv0
+            out[i, 1] = (coords[i, 1] - min1) * inv1
+        min_vals[0] = min0
+        min_vals[1] = min1
+        max_vals[0] = max0
+        max_vals[1] = max1
+
+    @njit(cache=True, fastmath=True)
+    def _denormalize_kernel(normalized, out, min_vals, scale):
+        """
+        Fused inverse of `_normalize_kernel` (multiply-add) in a single pass over the rows.
+        """
+        n, d = normalized.shape
+        for i in range(n):
+            for j in range(d):
+                out[i, j] = normalized[i, j] * scale[j] + min_vals[j]
+
+def _precompute_scale(min_vals, max_vals):
+    """
+    Return the per-axis range (scale) and its reciprocal, so hot callers can compute them once
+    and reuse them instead of recomputing max_vals - min_vals on every call.
+
+    A zero range (constant axis or a single point) gets a reciprocal of 1, so it normalizes to 0
+    instead of NaN (like MinMaxScaler), and denormalizing still maps back to min_vals.
+    """
+    scale = np.subtract(max_vals, min_vals, dtype=np.float64)
+    return scale, 1.0 / np.where(scale == 0, 1.0, scale)
 
 def normalize_coordinates(coordinates):
+    if njit is not None:
+        coords = np.ascontiguousarray(coordinates, dtype=np.float64)
+        # The kernels seed min/max from row 0 without bounds checks, fail like np.min would on no rows
+        if coords.shape[0] == 0:
+            raise ValueError("zero-size array to reduction operation minimum which has no identity")
+        out = np.empty_like(coords)
+        min_vals = np.empty(coords.shape[1])
+        max_vals = np.empty(coords.shape[1])
+        # Coordinates are (latitude, longitude) pairs in practice, use the specialized 2-column kernel
+        if coords.shape[1] == 2:
+            _normalize_nx2_kernel(coords, out, min_vals, max_vals)
+        else:
+            _normalize_kernel(coords, out, min_vals, max_vals)
+        return out, min_vals, max_vals
+
     min_vals = np.min(coordinates, axis=0)
     max_vals = np.max(coordinates, axis=0)
-    return (coordinates - min_vals) / (max_vals - min_vals), min_vals, max_vals
+    _, inv_scale = _precompute_scale(min_vals, max_vals)
+    # Write into one preallocated buffer, no (coordinates - min_vals) temporary
+    out = np.empty_like(coordinates, dtype=np.float64)
+    np.subtract(coordinates, min_vals, out=out)
+    np.multiply(out, inv_scale, out=out)
+    return out, min_vals, max_vals
+
+def denormalize_coordinates(normalized_coords, min_vals, max_vals=None, scale=None):
+    """
+    Map normalized coordinates back to their original range.
 
-def denormalize_coordinates(normalized_coords, min_vals, max_vals):
-    return normalized_coords * (max_vals - min_vals) + min_vals
+    Either max_vals or a precomputed scale (max_vals - min_vals, see _precompute_scale) must be given.
+    """
+    if scale is None:
+        scale, _ = _precompute_scale(min_vals, max_vals)
+    min_vals = np.asarray(min_vals, dtype=np.float64)
 
+    if njit is not None:
+        normalized = np.ascontiguousarray(normalized_coords, dtype=np.float64)
+        out = np.empty_like(normalized)
+        _denormalize_kernel(normalized, out, min_vals, np.asarray(scale, dtype=np.float64))
+        return out
+
+    # Multiply-add in place on a single output buffer
+    out = np.empty_like(normalized_coords, dtype=np.float64)
+    np.multiply(normalized_coords, scale, out=out)
+    np.add(out, min_vals, out=out)
+    return out
+
+@_locked_plot
 def visualize_clusters(data, labels, centroids, output_path="static/cluster_plot.png"):
     """
     Visualize clusters and centroids.
@@ -20,23 +288,110 @@ def visualize_clusters(data, labels, centroids, output_path="static/cluster_plot
         centroids (numpy.ndarray): Coordinates of the cluster centroids.
         output_path (str): File path to save the plot.
     """
-    plt.figure(figsize=(8, 6))
-    # Scatter plot for data points
-    for label in np.unique(labels):
-        cluster_points = data[labels == label]
-        plt.scatter(cluster_points[:, 0], cluster_points[:, 1], label=f"Cluster {label}")
+    fig = _get_fig("cluster", (8, 6))
+    # Labels present in the data: O(N) bincount instead of sorting the labels with np.unique
+    label_counts = np.bincount(labels)
+    present_labels = np.nonzero(label_counts)[0]
+    cluster_names = [f"Cluster {label}" for label in present_labels]
+    if mpl_scatter_density is not None and len(data) > DENSITY_PLOT_THRESHOLD:
+        # Too many points for markers: rasterize each cluster into a density map
+        ax = plt.subplot(1, 1, 1, projection='scatter_density')
+        colors = plt.cm.tab10.colors
+        handles = []
+        # Sort points by label once so each cluster is a contiguous slice (no boolean mask per cluster)
+        data_sorted = data[np.argsort(labels, kind='stable')]
+        boundaries = np.concatenate(([0], np.cumsum(label_counts)))
+        for label in present_labels:
+            cluster_points = data_sorted[boundaries[label]:boundaries[label + 1]]
+            color = colors[label % len(colors)]
+            ax.scatter_density(cluster_points[:, 0], cluster_points[:, 1], color=color)
+            handles.append(Line2D([], [], marker='o', linestyle='', color=color))
+    else:
+        # Single scatter plot for all data points, colored by cluster (vmin/vmax keep cluster i on tab10 color i)
+        points = plt.scatter(data[:, 0], data[:, 1], c=labels, cmap='tab10', vmin=0, vmax=9)
+        # Legend entries per cluster come from the color mapping of the single scatter
+        handles, _ = points.legend_elements(num=None)
     # Scatter plot for centroids
-    plt.scatter(centroids[:, 0], centroids[:, 1], color='red', marker='x', label='Centroids')
-    plt.legend()
+    centroid_points = plt.scatter(centroids[:, 0], centroids[:, 1], color='red', marker='x', label='Centroids')
+    plt.legend(handles + [centroid_points], cluster_names + ['Centroids'])
     plt.grid(True)
     plt.title("Cluster Visualization")
     plt.xlabel("Longitude (Normalized)")
     plt.ylabel("Latitude (Normalized)")
 
     # Save plot instead of showing it
-    plt.savefig(output_path)
-    plt.close()
+    _save_palettized_png(fig, output_path)
+
+def _annotate_points(ax, points, names, color=None, max_labels=MAX_ROUTING_LABELS):
+    """
+    Label points on the axes while limiting the number of text artists created.
+
+    - Only every k-th point is labeled when there are more than max_labels points.
+    - Points that land on the same display pixel share a single label.
+    - Labels outside the visible axes are clipped.
+
+    Parameters:
+        ax (matplotlib.axes.Axes): Axes to draw on (must already contain the plotted points).
+        points (numpy.ndarray): Array of shape (N, 2) with the (x, y) positions to label.
+        names (list): Label text for each point.
+        color (str or tuple, optional): Text color.
+        max_labels (int, optional): Maximum number of labels before thinning kicks in.
+    """
+    if len(points) == 0:
+        return
+    step = max(len(points) // max_labels, 1)
+    points = points[::step]
+    names = names[::step]
 
+    # Merge labels of points within the same display pixel (keep the first one)
+    ax.autoscale_view()
+    pixels = np.round(ax.transData.transform(points)).astype(np.int64)
+    _, first_idx = np.unique(pixels, axis=0, return_index=True)
+
+    for i in np.sort(first_idx):
+        ax.annotate(names[i], points[i], fontsize=9, ha="right", color=color, annotation_clip=True, clip_on=True)
+
+def _merge_nearby_points(points, eps=MERGE_GRID_SIZE):
+    """
+    Merge points whose coordinates fall into the same eps-sized grid cell.
+
+    Parameters:
+        points (numpy.ndarray): Array of shape (N, 2) with the point positions.
+        eps (float, optional): Grid cell size.
+
+    Returns:
+        tuple:
+            - merged_points (numpy.ndarray): Mean position of the points of each occupied cell.
+            - counts (numpy.ndarray): Number of original points merged into each one.
+            - inverse (numpy.ndarray): Index of the merged point each original point belongs to.
+    """
+    cells = np.round(points / eps).astype(np.int64)
+    _, inverse, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    sums = np.zeros((len(counts), points.shape[1]))
+    np.add.at(sums, inverse, points)
+    return sums / counts[:, None], counts, inverse
+
+def _scatter_points(points, color, marker="o", size=100):
+    """
+    Scatter a group of points, merging overlapping points into larger markers (area grows with
+    sqrt of the count) for crowded groups.
+
+    Returns:
+        tuple:
+            - handle: Legend handle for the group (always drawn at the plain marker size).
+            - positions (numpy.ndarray): Drawn position of each original point (its merged marker's
+              position when merged), so route segments and labels line up with the markers.
+    """
+    if len(points) <= MERGE_POINTS_THRESHOLD:
+        return plt.scatter(points[:, 0], points[:, 1], color=color, marker=marker, s=size), points
+    merged_points, counts, inverse = _merge_nearby_points(points)
+    plt.scatter(merged_points[:, 0], merged_points[:, 1], color=color, marker=marker, s=size * np.sqrt(counts))
+    # Scatter sizes are areas (points^2), Line2D marker sizes are widths (points)
+    handle = Line2D([], [], color=color, marker=marker, linestyle="", markersize=np.sqrt(size))
+    return handle, merged_points[inverse]
+
+@_locked_plot
 def visualize_routing(grouped_clusters, unvisitable, output_path="static/routing_plot.png"):
     """
     Visualize the routing for all clusters, showing schedules and unvisited locations.
@@ -46,51 +401,63 @@ def visualize_routing(grouped_clusters, unvisitable, output_path="static/routing
         unvisitable (list): List of unvisited locations.
         output_path (str): File path to save the routing visualization.
     """
-    plt.figure(figsize=(12, 8))
+    fig = _get_fig("routing", (12, 8))
+    ax = plt.gca()
 
-    colors = plt.cm.tab10.colors  # Colormap
-    cluster_colors = {}
+    # Assign a unique color to each cluster up front (tab10 colormap)
+    colors = plt.cm.tab10.colors
+    num_colors = len(colors)
+    cluster_colors = {cluster_id: colors[cluster_id % num_colors] for cluster_id in grouped_clusters}
+    point_labels = []  # (points, names, color) per group, annotated once everything is plotted
+    segments = []  # Route segments of all clusters, drawn as one LineCollection
+    segment_colors = []
+    legend_entries = {}  # Legend label -> handle, filled while plotting (insertion order = legend order)
 
     # Plot each cluster
     for cluster_id, cluster_data in grouped_clusters.items():
         schedule = cluster_data["schedule"]
-        color = colors[cluster_id % len(colors)]  # Assign a unique color to each cluster
-        cluster_colors[cluster_id] = color
+        color = cluster_colors[cluster_id]
 
-        # Extract coordinates and plot them
-        coordinates = [loc["coordinates"] for loc in schedule]
+        # Extract coordinates once as an (N, 2) array of (longitude, latitude) and plot them
+        points = np.asarray([loc["coordinates"] for loc in schedule], dtype=np.float64).reshape(-1, 2)[:, ::-1]
         names = [f"{i + 1}: {loc['name']}" for i, loc in enumerate(schedule)]
 
-        # Plot points
-        for i, coord in enumerate(coordinates):
-            plt.scatter(coord[1], coord[0], color=color, label=f"Cluster {cluster_id}" if i == 0 else "", s=100)
-            plt.text(coord[1], coord[0], names[i], fontsize=9, ha="right")
+        # Plot points (one scatter per cluster), crowded clusters continue from the merged positions
+        if len(points):
+            handle, points = _scatter_points(points, color)
+            legend_entries.setdefault(f"Cluster {cluster_id}", handle)
+        point_labels.append((points, names, None))
 
-        # Plot connections
-        for i in range(len(coordinates) - 1):
-            start = coordinates[i]
-            end = coordinates[i + 1]
-            plt.plot([start[1], end[1]], [start[0], end[0]], color=color, linestyle="--", alpha=0.7)
+        # Collect connections between consecutive stops, shape (N - 1, 2, 2)
+        cluster_segments = np.stack([points[:-1], points[1:]], axis=1)
+        segments.extend(cluster_segments)
+        segment_colors.extend([color] * len(cluster_segments))
+
+    # Plot all connections at once
+    ax.add_collection(LineCollection(segments, colors=segment_colors, linestyles="--", alpha=0.7))
 
     # Plot unvisited locations
-    for location in unvisitable:
-        coord = location.coordinates
-        plt.scatter(coord[1], coord[0], color="red", label="Unvisitable", marker="x", s=100)
-        plt.text(coord[1], coord[0], location.name, fontsize=9, ha="right", color="red")
+    unvisitable_points = np.array([loc.coordinates for loc in unvisitable], dtype=np.float64).reshape(-1, 2)[:, ::-1]
+    if len(unvisitable_points):
+        handle, unvisitable_points = _scatter_points(unvisitable_points, "red", marker="x")
+        legend_entries.setdefault("Unvisitable", handle)
+    point_labels.append((unvisitable_points, [loc.name for loc in unvisitable], "red"))
+
+    # Label points (thinned out and merged per pixel for crowded plots)
+    for points, names, color in point_labels:
+        _annotate_points(ax, points, names, color)
 
     # Add legend and labels
-    handles, labels = plt.gca().get_legend_handles_labels()
-    by_label = dict(zip(labels, handles))
-    plt.legend(by_label.values(), by_label.keys(), loc="upper left")
+    plt.legend(list(legend_entries.values()), list(legend_entries.keys()), loc="upper left")
     plt.title("Routing Visualization")
     plt.xlabel("Longitude")
     plt.ylabel("Latitude")
     plt.grid(True)
 
     # Save the plot
-    plt.savefig(output_path)
-    plt.close()
+    _save_palettized_png(fig, output_path)
     
+@_locked_plot
 def generate_schedule_table(schedule_table, cluster_id, output_path="static/schedule_table_cluster_{cluster_id}.png"):
     """
     Generate a table visualization for a daily schedule.
@@ -103,18 +470,20 @@ def generate_schedule_table(schedule_table, cluster_id, output_path="static/sche
     Returns:
         str: Path to the saved table image.
     """
-    # Convert the schedule to a pandas DataFrame
-    df = pd.DataFrame(schedule_table)
+    # Column names and rows of cell values straight from the schedule dicts
+    cols = list(schedule_table[0].keys()) if schedule_table else []
+    cells = [[row.get(c, '') for c in cols] for row in schedule_table]
 
     # Create a figure and axis to draw the table
-    fig, ax = plt.subplots(figsize=(12, len(df) * 0.6 + 1))  # Adjust height dynamically
+    fig = _get_fig("schedule_table", (12, len(cells) * 0.6 + 1))  # Adjust height dynamically
+    ax = fig.add_subplot()
     ax.axis('tight')
     ax.axis('off')
 
     # Create the table
     table = plt.table(
-        cellText=df.values,
-        colLabels=df.columns,
+        cellText=cells,
+        colLabels=cols,
         cellLoc='center',
         loc='center'
     )
@@ -122,10 +491,16 @@ def generate_schedule_table(schedule_table, cluster_id, output_path="static/sche
     # Customize table appearance
     table.auto_set_font_size(False)
     table.set_fontsize(10)
-    table.auto_set_column_width(col=list(range(len(df.columns))))
+    # Column widths estimated from the longest text per column (header included), set in one pass
+    # instead of auto_set_column_width which measures every cell with the renderer
+    widths = [max(len(str(value)) for value in [col] + [row[i] for row in cells]) * 0.012 for i, col in enumerate(cols)]
+    for (_, col_idx), cell in table.get_celld().items():
+        cell.set_width(widths[col_idx])
 
-    # Save the table as an image
+    # Save the table as an image (plain savefig: bbox_inches/dpi need a re-render anyway,
+    # decoding and palettizing that PNG again would only add a second encode)
     output_path = output_path.format(cluster_id=cluster_id)
-    plt.savefig(output_path, bbox_inches='tight', dpi=300)
-    plt.close()
+    buf = BytesIO()
+    fig.savefig(buf, format="png", bbox_inches='tight', dpi=300)
+    _write_png(buf, output_path)
     return output_path
\ No newline at end of file